@@ -1,10 +1,18 @@
+import io
+
+import pandas as pd
 import streamlit as st
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 from appa import (
-    load_demand_data, naive_forecast, three_weeks_moving_average, exponential_smoothing,
-    get_actual_demand, get_all_forecasts, get_error_table, get_best_methods, forecast_next_week, export_to_excel
+    CACHE_TTL, FORECAST_COLS, hash_frame, load_forecasts,
+    get_actual_demand, get_all_forecasts, get_error_table, get_best_methods, forecast_next_week,
+    EXPORT_FORMATS, EXPORT_MIME_TYPES, DOWNLOAD_ONLY_ROWS, export_to_bytes, export_to_file
 )
 
+# Column-subset views share memory until written (always on from pandas 3.0)
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
 # ================== Page Config ==================
 st.set_page_config(
     page_title="Demand Forecasting Dashboard",
@@ -15,14 +23,37 @@ st.set_page_config(
 st.title("📊 Demand Forecasting Dashboard")
 st.markdown("This app shows demand forecasts, error metrics, and predictions for next week.")
 
+# ================== Plot Builder ==================
+@st.cache_data(ttl=CACHE_TTL, max_entries=4)
+def render_forecast_pngs(cols, data_key, _df):
+    """Render one actual-vs-forecast PNG per column in `cols`, cached per data_key.
+
+    Caching the encoded images rather than Figures means sessions never share
+    a (non thread-safe) matplotlib object.
+    """
+    weeks = _df['Week'].to_numpy()
+    demand = _df['Demand'].to_numpy()
+    pngs = {}
+    for col in cols:
+        fig = Figure(figsize=(10,4))
+        ax = fig.subplots()
+        ax.plot(weeks, demand, marker='o', label='Actual Demand')
+        ax.plot(weeks, _df[col].to_numpy(), marker='o', label=col)
+        ax.set_xlabel("Week")
+        ax.set_ylabel("Quantity")
+        ax.grid(True)
+        ax.legend()
+        buf = io.BytesIO()
+        fig.savefig(buf, format='png', dpi=200, bbox_inches='tight')
+        pngs[col] = buf.getvalue()
+    return pngs
+
 # ================== Load Data ==================
 file_path = "Demand-History.xlsx"
-df = load_demand_data(file_path)
+ALPHA = 0.1
 
-# Apply Forecasts
-df = naive_forecast(df)
-df = three_weeks_moving_average(df)
-df = exponential_smoothing(df, alpha=0.1)
+# Apply Forecasts: cached per (file_path, ALPHA), so widget reruns skip this
+df = load_forecasts(file_path, alpha=ALPHA)
 
 # ================== Sidebar Controls ==================
 st.sidebar.header("Controls")
@@ -32,7 +63,25 @@ show_all_forecasts = st.sidebar.checkbox("Show All Forecasts", value=True)
 show_errors = st.sidebar.checkbox("Show Error Metrics")
 show_best = st.sidebar.checkbox("Show Best Forecast")
 show_next_week = st.sidebar.checkbox("Forecast Next Week")
-export_excel = st.sidebar.button("Export Current Table to Excel")
+export_format = st.sidebar.radio("Export format", EXPORT_FORMATS, horizontal=True)
+export_tables = st.sidebar.button("Export Current Tables")
+
+def export_table(table, label, stem):
+    """Offer `table` as a download in the chosen format, also saving small tables to disk"""
+    if len(table) >= DOWNLOAD_ONLY_ROWS:
+        filename = f"{stem}.{export_format}"
+        data = export_to_bytes(table, export_format)
+        st.info(f"{label} is large; download it below instead of saving to disk")
+    else:
+        filename, data = export_to_file(table, stem, export_format)
+        st.success(f"{label} exported to {filename}")
+    st.download_button(
+        f"Download {filename}",
+        data=data,
+        file_name=filename,
+        mime=EXPORT_MIME_TYPES[export_format],
+        key=f"download_{stem}",
+    )
 
 # ================== Display Actual Demand ==================
 if show_actual:
@@ -40,9 +89,8 @@ if show_actual:
     actual_df = get_actual_demand(df)
     st.dataframe(actual_df)
 
-    if export_excel:
-        export_to_excel(actual_df, "Actual_Demand.xlsx")
-        st.success("Actual Demand exported to Actual_Demand.xlsx")
+    if export_tables:
+        export_table(actual_df, "Actual Demand", "Actual_Demand")
 
 # ================== Display All Forecasts ==================
 if show_all_forecasts:
@@ -50,9 +98,8 @@ if show_all_forecasts:
     all_df = get_all_forecasts(df)
     st.dataframe(all_df)
 
-    if export_excel:
-        export_to_excel(all_df, "All_Forecasts.xlsx")
-        st.success("All Forecasts exported to All_Forecasts.xlsx")
+    if export_tables:
+        export_table(all_df, "All Forecasts", "All_Forecasts")
 
 # ================== Display Error Metrics ==================
 if show_errors:
@@ -60,9 +107,8 @@ if show_errors:
     error_df = get_error_table(df)
     st.dataframe(error_df)
 
-    if export_excel:
-        export_to_excel(error_df, "Error_Metrics.xlsx")
-        st.success("Error Metrics exported to Error_Metrics.xlsx")
+    if export_tables:
+        export_table(error_df, "Error Metrics", "Error_Metrics")
 
 # ================== Display Best Methods ==================
 if show_best:
@@ -73,24 +119,19 @@ if show_best:
 # ================== Forecast Next Week ==================
 if show_next_week:
     st.subheader("🔮 Forecast for Next Week")
-    next_week_df = forecast_next_week(df, alpha=0.1)
+    next_week_df = forecast_next_week(df, alpha=ALPHA)
     st.dataframe(next_week_df)
 
-    if export_excel:
-        export_to_excel(next_week_df, "Next_Week_Forecast.xlsx")
-        st.success("Next Week Forecast exported to Next_Week_Forecast.xlsx")
+    if export_tables:
+        export_table(next_week_df, "Next Week Forecast", "Next_Week_Forecast")
 
 # ================== Forecast Plots ==================
 st.subheader("📈 Forecast Plots")
-forecast_cols = ['Naive', 'ThreeWeeksMA', 'ExponentialSmoothing']
 
-for col in forecast_cols:
+data_key = hash_frame(df.loc[:, ['Week', 'Demand', *FORECAST_COLS]])
+
+pngs = render_forecast_pngs(FORECAST_COLS, data_key, df)
+
+for col in FORECAST_COLS:
     st.markdown(f"**{col} Forecast**")
-    fig, ax = plt.subplots(figsize=(10,4))
-    ax.plot(df['Week'], df['Demand'], marker='o', label='Actual Demand')
-    ax.plot(df['Week'], df[col], marker='o', label=col)
-    ax.set_xlabel("Week")
-    ax.set_ylabel("Quantity")
-    ax.grid(True)
-    ax.legend()
-    st.pyplot(fig)
+    st.image(pngs[col], width="stretch")
@@ -1,30 +1,200 @@
+import io
+import os
+import tempfile
+import threading
+
 import pandas as pd
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 import matplotlib.pyplot as plt
+import streamlit as st
+
+try:
+    import numba
+    from numba import njit, prange
+    HAS_NUMBA = True
+except ImportError:
+    prange = range
+    HAS_NUMBA = False
+
+try:
+    import bottleneck as bn
+    HAS_BOTTLENECK = True
+except ImportError:
+    HAS_BOTTLENECK = False
+
+CACHE_TTL = 24 * 60 * 60  # seconds
+FORECAST_COLS = ('Naive', 'ThreeWeeksMA', 'ExponentialSmoothing')
+DEMAND_DTYPE = np.float32  # weekly demand is integral and far below 2**24
+
+def hash_frame(df):
+    """Content hash for DataFrame arguments of cached functions"""
+    return (
+        tuple(df.columns),
+        tuple(str(dtype) for dtype in df.dtypes),
+        pd.util.hash_pandas_object(df, index=True).values.tobytes(),
+    )
+
+FRAME_HASH_FUNCS = {pd.DataFrame: hash_frame}
+
+_UMASK = os.umask(0)  # read once at import; os.umask can only be queried by setting it
+os.umask(_UMASK)
 
 # ================== Load Data ==================
+@st.cache_data(ttl=CACHE_TTL)
 def load_demand_data(file_path):
-    """Load Excel file with columns 'Week' and 'Demand'"""
-    return pd.read_excel(file_path)
+    """Load Excel file with columns 'Week' and 'Demand'.
+
+    A Parquet copy is kept next to the workbook and read instead while it is
+    newer than the workbook.
+    """
+    parquet_path = os.path.splitext(file_path)[0] + '.parquet'
+    if (os.path.exists(parquet_path)
+            and os.path.getmtime(parquet_path) >= os.path.getmtime(file_path)):
+        try:
+            return pd.read_parquet(parquet_path)
+        except Exception:
+            pass  # unreadable sidecar: rebuild it from the workbook
+    df = pd.read_excel(file_path)
+    df['Demand'] = df['Demand'].astype(DEMAND_DTYPE)
+    _write_sidecar(df, parquet_path)
+    return df
+
+def _write_sidecar(df, parquet_path):
+    """Atomically replace the Parquet copy so readers never see a partial file"""
+    try:
+        fd, tmp_path = tempfile.mkstemp(
+            suffix='.parquet.tmp', dir=os.path.dirname(parquet_path) or '.')
+    except OSError:
+        return  # read-only location: keep serving from Excel
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            df.to_parquet(tmp, index=False)
+        os.chmod(tmp_path, 0o666 & ~_UMASK)  # mkstemp creates 0600
+        os.replace(tmp_path, parquet_path)
+    except Exception:
+        # the sidecar is only a cache; never fail the load because of it
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
 
 # ================== Forecast Functions ==================
+def _lag(demand):
+    """Previous week's demand (NaN for the first week)"""
+    shifted = np.empty_like(demand)
+    shifted[:1] = np.nan
+    shifted[1:] = demand[:-1]
+    return shifted
+
 def naive_forecast(df):
-    df['Naive'] = df['Demand'].shift(1)
+    df['Naive'] = _lag(df['Demand'].to_numpy(dtype=DEMAND_DTYPE))
     return df
 
-def three_weeks_moving_average(df):
-    df['ThreeWeeksMA'] = df['Demand'].rolling(window=3).mean().shift(1)
+SLIDING_WINDOW_MAX = 32  # larger windows use the O(n) cumsum difference
+
+def _moving_average(demand, window=3):
+    """Trailing mean of the previous `window` values (NaN until filled)"""
+    out = np.full(demand.size, np.nan, dtype=demand.dtype)
+    if demand.size <= window:
+        return out
+    if HAS_BOTTLENECK:
+        ma = bn.move_mean(demand.astype(np.float64), window, min_count=window)[window-1:-1]
+    elif window <= SLIDING_WINDOW_MAX:
+        ma = sliding_window_view(demand[:-1], window).mean(axis=1, dtype=np.float64)
+    else:
+        missing = np.isnan(demand)
+        c = np.concatenate(([0.0], np.cumsum(np.where(missing, 0.0, demand), dtype=np.float64)))
+        k = np.concatenate(([0], np.cumsum(missing)))
+        ma = (c[window:-1] - c[:-window-1]) / window
+        # Like rolling().mean(), only windows that contain a NaN are NaN
+        ma[(k[window:-1] - k[:-window-1]) > 0] = np.nan
+    out[window:] = ma
+    return out
+
+def three_weeks_moving_average(df, window=3):
+    df['ThreeWeeksMA'] = _moving_average(df['Demand'].to_numpy(dtype=DEMAND_DTYPE), window)
     return df
 
+def _ewm_loop(demand, alpha):
+    """Recursive exponential smoothing over a demand array"""
+    out = np.empty_like(demand)
+    out[0] = demand[0]
+    one_minus_a = 1.0 - alpha
+    for i in range(1, demand.size):
+        out[i] = alpha * demand[i-1] + one_minus_a * out[i-1]
+    return out
+
+if HAS_NUMBA:
+    _ewm_kernel = njit(cache=True)(_ewm_loop)
+
+def _ewm_vectorized(demand, alpha):
+    """Closed-form exponential smoothing via block-wise cumulative sums"""
+    r = 1.0 - alpha
+    out = np.empty_like(demand)
+    out[0] = demand[0]
+    if r == 0.0:
+        out[1:] = demand[:-1]
+        return out
+    # Keep r ** -block inside float64 range so the rescaling never overflows
+    block = int(min(1000, max(1, -150 / np.log10(r)))) if r < 1.0 else 1000
+    if block < 32:
+        # Blocks this short cost more in NumPy calls than the scalar loop
+        return _ewm_loop(demand, alpha)
+    for start in range(1, demand.size, block):
+        stop = min(start + block, demand.size)
+        powers = r ** np.arange(1, stop - start + 1)
+        weighted = alpha * demand[start-1:stop-1] / powers
+        out[start:stop] = powers * (out[start-1] + np.cumsum(weighted))
+    return out
+
 def exponential_smoothing(df, alpha=0.1):
-    forecasts = []
-    for i in range(len(df)):
-        if i == 0:
-            forecasts.append(df.loc[i, 'Demand'])
-        else:
-            forecast = alpha * df.loc[i-1, 'Demand'] + (1-alpha) * forecasts[i-1]
-            forecasts.append(forecast)
-    df['ExponentialSmoothing'] = forecasts
+    demand = df['Demand'].to_numpy(dtype=DEMAND_DTYPE)
+    if demand.size == 0:
+        df['ExponentialSmoothing'] = demand
+        return df
+    kernel = _ewm_kernel if HAS_NUMBA else _ewm_vectorized
+    df['ExponentialSmoothing'] = kernel(demand, float(alpha))
+    return df
+
+def _forecast_kernel(demand, alpha):
+    """Naive, 3-week MA and exponential smoothing in a single pass over demand"""
+    n = demand.size
+    naive = np.empty_like(demand)
+    naive[:] = np.nan
+    ma3 = np.empty_like(demand)
+    ma3[:] = np.nan
+    ewm = np.empty_like(demand)
+    if n == 0:
+        return naive, ma3, ewm
+    ewm[0] = demand[0]
+    one_minus_a = 1.0 - alpha
+    for i in range(1, n):
+        naive[i] = demand[i-1]
+        ewm[i] = alpha * demand[i-1] + one_minus_a * ewm[i-1]
+        if i >= 3:
+            # Summed from the window itself so a NaN week only affects its own windows
+            ma3[i] = (float(demand[i-3]) + float(demand[i-2]) + float(demand[i-1])) / 3
+    return naive, ma3, ewm
+
+if HAS_NUMBA:
+    _forecast_kernel = njit(cache=True)(_forecast_kernel)
+
+def compute_all_forecasts(demand, alpha=0.1):
+    """Return (naive, three_weeks_ma, exp_smoothing) arrays matching the demand dtype"""
+    if HAS_NUMBA:
+        return _forecast_kernel(demand, float(alpha))
+    naive = _lag(demand)
+    ma3 = _moving_average(demand, 3)
+    ewm = _ewm_vectorized(demand, float(alpha)) if demand.size else np.empty_like(demand)
+    return naive, ma3, ewm
+
+@st.cache_data(ttl=CACHE_TTL)
+def load_forecasts(file_path, alpha=0.1):
+    """Load demand data and apply all forecasts, cached per (file_path, alpha)"""
+    df = load_demand_data(file_path)
+    demand = df['Demand'].to_numpy(dtype=DEMAND_DTYPE)
+    df[list(FORECAST_COLS)] = np.column_stack(
+        compute_all_forecasts(demand, alpha)
+    )
     return df
 
 # ================== Plot Functions ==================
@@ -41,39 +211,111 @@ def plot_forecast(df, forecast_col, title_suffix=""):
     plt.show()
 
 # ================== Error Metrics ==================
+PARALLEL_MIN_SIZE = 10_000  # below this, thread start-up outweighs the parallel reduction
+
+def _error_sums(demand, forecast):
+    """Sum, sum of squares, sum of absolutes and count of non-NaN errors in one pass"""
+    s = 0.0
+    s2 = 0.0
+    sa = 0.0
+    n = 0
+    for i in prange(demand.size):
+        e = demand[i] - forecast[i]
+        if not np.isnan(e):
+            s += e
+            s2 += e * e
+            sa += abs(e)
+            n += 1
+    return s, s2, sa, n
+
+HAS_PARALLEL = HAS_NUMBA  # cleared if no thread-safe threading layer can be loaded
+_parallel_checked = False
+_parallel_lock = threading.Lock()
+
+if HAS_NUMBA:
+    _error_sums = njit(parallel=True, cache=True)(_error_sums)
+
+def _check_parallel():
+    """Load a thread-safe Numba threading layer once; return whether one is available"""
+    global HAS_PARALLEL, _parallel_checked
+    if _parallel_checked:
+        return HAS_PARALLEL
+    with _parallel_lock:
+        if _parallel_checked:
+            return HAS_PARALLEL
+        if 'NUMBA_THREADING_LAYER' in os.environ:
+            layers = [numba.config.THREADING_LAYER]  # the deployer's choice wins
+        else:
+            # Streamlit sessions launch kernels from concurrent worker threads, which
+            # workqueue cannot handle; TBB can hang interpreter exit, so prefer OpenMP.
+            layers = ['omp', 'tbb']
+        configured = numba.config.THREADING_LAYER
+        available = False
+        for layer in layers:
+            numba.config.THREADING_LAYER = layer
+            try:
+                _error_sums(np.zeros(1), np.zeros(1))  # compiles and launches the threads
+            except ValueError:  # layer could not be loaded
+                continue
+            available = True
+            break
+        # threads are launched once per process, so the setting is only needed above
+        numba.config.THREADING_LAYER = configured
+        HAS_PARALLEL = available
+        _parallel_checked = True
+    return HAS_PARALLEL
+
+def _error_stats(demand, forecast):
+    """Return (MAD, MSE, TS) from a single error array, ignoring NaN forecasts"""
+    if HAS_NUMBA and demand.size >= PARALLEL_MIN_SIZE and _check_parallel():
+        s, s2, sa, n = _error_sums(demand, forecast)
+        if n == 0:
+            return np.nan, np.nan, np.nan
+        mad = sa / n
+        return mad, s2 / n, (s / mad if mad != 0 else np.nan)
+    err = demand - forecast
+    if np.isnan(err).all():  # e.g. ThreeWeeksMA on 3 weeks or fewer
+        return np.nan, np.nan, np.nan
+    mad = np.nanmean(np.abs(err))
+    mse = np.nanmean(err * err)
+    ts = np.nansum(err) / mad if mad != 0 else np.nan
+    return mad, mse, ts
+
+def _error_metrics(df, forecast_cols):
+    """Map each forecast column to its (MAD, MSE, TS), accumulated in float64"""
+    demand = df['Demand'].to_numpy(dtype=np.float64)
+    return {
+        col: _error_stats(demand, df[col].to_numpy(dtype=np.float64))
+        for col in forecast_cols
+    }
+
 def mean_absolute_deviation(df, forecast_col):
-    errors = df['Demand'] - df[forecast_col]
-    return errors.abs().mean()
+    """MAD of one forecast; kept for API compatibility, computes all three metrics"""
+    return _error_metrics(df, [forecast_col])[forecast_col][0]
 
 def mean_squared_error(df, forecast_col):
-    errors = df['Demand'] - df[forecast_col]
-    return (errors ** 2).mean()
+    """MSE of one forecast; kept for API compatibility, computes all three metrics"""
+    return _error_metrics(df, [forecast_col])[forecast_col][1]
 
 def tracking_signal(df, forecast_col):
-    errors = df['Demand'] - df[forecast_col]
-    mad = errors.abs().mean()
-    ts = errors.sum() / mad if mad != 0 else np.nan
-    return ts
+    """TS of one forecast; kept for API compatibility, computes all three metrics"""
+    return _error_metrics(df, [forecast_col])[forecast_col][2]
 
 # ================== Best Forecast ==================
 def best_forecast(df, method='MAD'):
-    forecast_cols = [col for col in df.columns if col not in ['Week', 'Demand']]
-    errors = {}
-    
-    for col in forecast_cols:
-        if method == 'MAD':
-            errors[col] = mean_absolute_deviation(df, col)
-        elif method == 'MSE':
-            errors[col] = mean_squared_error(df, col)
-        else:
-            raise ValueError("Method must be 'MAD' or 'MSE'")
-    
-    best_col = min(errors, key=errors.get)
+    if method not in ('MAD', 'MSE'):
+        raise ValueError("Method must be 'MAD' or 'MSE'")
+    errors = get_error_table(df).set_index('Method')[method]
+    best_col = errors.idxmin()
     return best_col, errors[best_col]
 
+@st.cache_data(ttl=CACHE_TTL, hash_funcs=FRAME_HASH_FUNCS)
 def get_best_methods(df):
-    best_mad_col, best_mad = best_forecast(df, method='MAD')
-    best_mse_col, best_mse = best_forecast(df, method='MSE')
+    table = get_error_table(df).set_index('Method')
+    best_mad_col = table['MAD'].idxmin()
+    best_mse_col = table['MSE'].idxmin()
+    best_mad = table.loc[best_mad_col, 'MAD']
+    best_mse = table.loc[best_mse_col, 'MSE']
     return {
         'Best by MAD': (best_mad_col, best_mad),
         'Best by MSE': (best_mse_col, best_mse)
@@ -81,21 +323,22 @@ def get_best_methods(df):
 
 # ================== Forecast Next Week ==================
 def forecast_next_week(df, alpha=0.1):
-    next_week = df['Week'].max() + 1
+    weeks = df['Week'].to_numpy()
+    demand = df['Demand'].to_numpy(dtype=np.float64)
+    ewm = df['ExponentialSmoothing'].to_numpy(dtype=np.float64)
+    next_week = int(np.nanmax(weeks)) + 1
     
     # Naive
-    naive = df['Demand'].iloc[-1]
+    naive = float(demand[-1])
     
     # Three Weeks Moving Average
-    if len(df) >= 3:
-        three_weeks_ma = df['Demand'].iloc[-3:].mean()
+    if demand.size >= 3:
+        three_weeks_ma = float(np.nanmean(demand[-3:]))
     else:
-        three_weeks_ma = df['Demand'].mean()
+        three_weeks_ma = float(np.nanmean(demand))
     
     # Exponential Smoothing
-    last_forecast = df['ExponentialSmoothing'].iloc[-1]
-    last_demand = df['Demand'].iloc[-1]
-    exp_smoothing = alpha * last_demand + (1-alpha) * last_forecast
+    exp_smoothing = alpha * naive + (1-alpha) * float(ewm[-1])
     
     return pd.DataFrame([{
         'Week': next_week,
@@ -107,26 +350,56 @@ def forecast_next_week(df, alpha=0.1):
 # ================== DataFrame Views (Streamlit Helpers) ==================
 def get_actual_demand(df):
     """Return DataFrame with Week & Actual Demand only"""
-    return df[['Week', 'Demand']]
+    return df.loc[:, ['Week', 'Demand']]
 
 def get_all_forecasts(df):
     """Return DataFrame with Week, Actual Demand, and all Forecasts"""
-    return df[['Week', 'Demand', 'Naive', 'ThreeWeeksMA', 'ExponentialSmoothing']]
+    return df.loc[:, ['Week', 'Demand', *FORECAST_COLS]]
 
+@st.cache_data(ttl=CACHE_TTL, hash_funcs=FRAME_HASH_FUNCS)
 def get_error_table(df):
     """Return table with MAD, MSE, TS for all Forecasts"""
-    data = []
-    for method in ['Naive', 'ThreeWeeksMA', 'ExponentialSmoothing']:
-        mad = mean_absolute_deviation(df, method)
-        mse = mean_squared_error(df, method)
-        ts = tracking_signal(df, method)
-        data.append([method, mad, mse, ts])
+    metrics = _error_metrics(df, FORECAST_COLS)
+    data = [[method, *stats] for method, stats in metrics.items()]
     return pd.DataFrame(data, columns=['Method', 'MAD', 'MSE', 'TS'])
 
 # ================== Export Function ==================
+EXPORT_FORMATS = ('xlsx', 'parquet', 'csv')
+EXPORT_MIME_TYPES = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'parquet': 'application/octet-stream',
+    'csv': 'text/csv',
+}
+DOWNLOAD_ONLY_ROWS = 100_000  # larger tables are offered as a download without a disk copy
+
+def _write_table(df, target, fmt):
+    if fmt == 'xlsx':
+        df.to_excel(target, index=False, engine='xlsxwriter')
+    elif fmt == 'parquet':
+        df.to_parquet(target, index=False)
+    elif fmt == 'csv':
+        df.to_csv(target, index=False)
+    else:
+        raise ValueError(f"Export format must be one of {EXPORT_FORMATS}")
+
 def export_to_excel(df, filename="forecast_export.xlsx"):
-    df.to_excel(filename, index=False)
+    _write_table(df, filename, 'xlsx')
+    print(f"Data exported to {filename}")
+
+def export_to_bytes(df, fmt='xlsx'):
+    """Serialize to an in-memory file for st.download_button"""
+    buf = io.BytesIO()
+    _write_table(df, buf, fmt)
+    return buf.getvalue()
+
+def export_to_file(df, stem, fmt='xlsx'):
+    """Serialize once, write `stem`.`fmt` to disk and return (filename, bytes)"""
+    data = export_to_bytes(df, fmt)
+    filename = f"{stem}.{fmt}"
+    with open(filename, 'wb') as f:
+        f.write(data)
     print(f"Data exported to {filename}")
+    return filename, data
 
 # ================== Main (for testing only) ==================
 if __name__ == "__main__":
@@ -143,7 +416,7 @@ if __name__ == "__main__":
     print(df)
     
     # Plot Forecasts
-    for forecast in ['Naive', 'ThreeWeeksMA', 'ExponentialSmoothing']:
+    for forecast in FORECAST_COLS:
         plot_forecast(df, forecast)
     
     # Calculate Error Metrics